@@ -1,17 +1,26 @@
-import os, json, uuid, datetime
+import os, io, uuid, datetime, threading, queue, time, hashlib, functools, mimetypes, random
+import concurrent.futures, contextlib
+from urllib.parse import quote
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env
 
 import numpy as np
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+import orjson
+from PIL import Image
+from joblib import Memory
+from cachetools import TTLCache
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, send_from_directory, abort
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.orm import defer, load_only
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_mail import Mail, Message
+import tensorflow as tf
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing import image as kimage
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
-from sklearn.metrics.pairwise import cosine_similarity
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash, safe_join
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 
 # Suppress TensorFlow GPU warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -20,12 +29,29 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 app = Flask(__name__, static_folder="static")
 app.secret_key = os.environ.get("FLASK_SECRET", "dev-secret")
 
+class OrjsonProvider(JSONProvider):
+    # jsonify()/get_json() through orjson; numpy values serialize directly.
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 # Ensure uploads folder exists
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Let the front-end server send uploads instead of the Python worker:
+# 'apache' uses X-Sendfile (mod_xsendfile), 'nginx' uses X-Accel-Redirect to
+# an internal location, e.g. `location /_uploads/ { internal; alias <UPLOAD_FOLDER>/; }`
+SENDFILE = os.environ.get('SENDFILE', '').lower()
+X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/_uploads/')
+app.use_x_sendfile = SENDFILE == 'apache'
+
 # Database
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(BASE_DIR, 'database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -36,6 +62,8 @@ app.config['MAIL_PORT'] = 587
 app.config['MAIL_USE_TLS'] = True
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_USERNAME')
+USE_MAIL = bool(app.config['MAIL_USERNAME'] and app.config['MAIL_PASSWORD'])
 
 db = SQLAlchemy(app)
 mail = Mail(app)
@@ -63,10 +91,11 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     phone = db.Column(db.String(30), nullable=True)
 
 class Item(db.Model):
+    __table_args__ = (db.Index('ix_item_type_user', 'type', 'user_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     type = db.Column(db.String(10))  # 'lost' or 'found'
@@ -75,44 +104,496 @@ class Item(db.Model):
     location = db.Column(db.String(120))
     contact = db.Column(db.String(120))
     image_filename = db.Column(db.String(200))
-    features = db.Column(db.Text)
+    image_hash = db.Column(db.String(32), index=True)
+    features = db.Column(db.LargeBinary)  # L2-normalized vector quantized to int8
     date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     def feature_array(self):
-        return np.array(json.loads(self.features), dtype=float)
+        return unpack_features(self.features)
+
+class Notification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    lost_item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
+    found_item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
+    message = db.Column(db.Text)
+    sent_time = db.Column(db.DateTime)
+    status = db.Column(db.String(20))  # 'pending', 'sent', 'skipped' or 'failed'
+
+FEAT_DIM = 1280
+QSCALE = 127.0  # unit vectors fit in int8 with a fixed scale
+
+def normalize(feats):
+    v = np.array(feats, dtype=np.float32).ravel()
+    v /= np.linalg.norm(v) + 1e-12
+    return v
+
+def quantize(v):
+    # Expects a unit vector, as returned by normalize().
+    return np.clip(np.round(v * QSCALE), -128, 127).astype(np.int8)
+
+def pack_features(feats):
+    # Stored vectors are unit length, so similarity is a plain dot product.
+    return quantize(normalize(feats)).tobytes()
+
+def unpack_features(blob):
+    return np.frombuffer(blob, dtype=np.int8).astype(np.float32) / QSCALE
+
+def schema_version():
+    # Bumped whenever tables are recreated (/reset in any worker), after which
+    # SQLite reuses ids from 1.
+    return db.session.execute(text("PRAGMA schema_version")).scalar()
+
+def upgrade_schema():
+    # create_all() never alters existing tables; add columns introduced since.
+    cols = {c['name'] for c in inspect(db.engine).get_columns('item')}
+    with db.engine.begin() as conn:
+        if 'image_hash' not in cols:
+            conn.execute(text("ALTER TABLE item ADD COLUMN image_hash VARCHAR(32)"))
+        for index in Item.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        # Re-pack features stored by older versions (JSON text, then float16).
+        rows = conn.execute(text("SELECT id, features FROM item "
+                                 "WHERE typeof(features) = 'text' OR length(features) != :n"),
+                            {'n': FEAT_DIM}).all()
+        for item_id, features in rows:
+            if isinstance(features, str):
+                old = orjson.loads(features)
+            else:
+                old = np.frombuffer(features, dtype=np.float16)
+            conn.execute(text("UPDATE item SET features = :f WHERE id = :id"),
+                         {'f': pack_features(old), 'id': item_id})
+
+def set_sqlite_pragmas(dbapi_conn, _):
+    # WAL persists in the database file; the rest are per connection.
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.close()
 
 with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)
     db.create_all()
+    upgrade_schema()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
 
 # ----- MODEL LOAD -----
-print("Loading MobileNetV2 (this may take a few seconds)...")
-model = MobileNetV2(weights='imagenet', include_top=False, pooling='avg')
-print("Model loaded.")
-
-def extract_features(img_path):
-    img = kimage.load_img(img_path, target_size=(224,224))
-    x = kimage.img_to_array(img)
-    x = np.expand_dims(x, axis=0)
-    x = preprocess_input(x)
-    feats = model.predict(x)
-    return feats.flatten().tolist()
+# MobileNetV2 runs through the TFLite interpreter as a full-integer (int8)
+# model; the Keras model is only needed once to produce MODEL_PATH.
+MODEL_PATH = os.path.join(BASE_DIR, 'mbv2_int8.tflite')
+
+CALIBRATION_SAMPLES = 100
+
+def preprocess_image(fp):
+    img = Image.open(fp).convert('RGB').resize((224,224), Image.BILINEAR)
+    # Same scaling as mobilenet_v2.preprocess_input, in place on one buffer.
+    x = np.asarray(img, dtype=np.float32)
+    x *= 1 / 127.5
+    x -= 1.0
+    return x
+
+def representative_dataset():
+    # Calibrate activation ranges on real uploads; noise in the preprocessed
+    # input range [-1, 1] is only a fallback when there are none yet.
+    names = os.listdir(UPLOAD_FOLDER)
+    used = 0
+    for name in random.sample(names, min(len(names), CALIBRATION_SAMPLES)):
+        try:
+            x = preprocess_image(os.path.join(UPLOAD_FOLDER, name))
+        except Exception:
+            continue
+        used += 1
+        yield [x[None]]
+    if not used:
+        for _ in range(CALIBRATION_SAMPLES):
+            yield [np.random.uniform(-1, 1, (1,224,224,3)).astype(np.float32)]
+
+def convert_model():
+    print("Converting MobileNetV2 to TFLite (one-time)...")
+    keras_model = MobileNetV2(weights='imagenet', include_top=False, pooling='avg')
+
+    # Tracing with a fixed signature and a None batch dimension gives the
+    # TFLite model a resizable batch input for the batching worker.
+    @tf.function(input_signature=[tf.TensorSpec([None,224,224,3], tf.float32)])
+    def infer_fn(x):
+        return keras_model(x, training=False)
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [infer_fn.get_concrete_function()], keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    tmp_path = MODEL_PATH + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(converter.convert())
+    os.replace(tmp_path, MODEL_PATH)
+
+if not os.path.exists(MODEL_PATH):
+    convert_model()
+
+with open(MODEL_PATH, 'rb') as f:
+    # Part of the feature disk-cache key, so a re-converted model never
+    # reuses outputs of the previous one.
+    MODEL_FINGERPRINT = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+interp = None
+# Interpreter threads per process; gunicorn.conf.py splits the CPUs between workers.
+INFER_THREADS = int(os.environ.get('INFER_THREADS', os.cpu_count()))
+
+def load_interpreter():
+    global interp, input_index, input_shape, input_scale, input_zero, output_index
+    print("Loading MobileNetV2 (this may take a few seconds)...")
+    interp = tf.lite.Interpreter(model_path=MODEL_PATH, num_threads=INFER_THREADS)
+    interp.allocate_tensors()
+    details = interp.get_input_details()[0]
+    input_index, input_shape = details['index'], tuple(details['shape'])
+    input_scale, input_zero = details['quantization']
+    output_index = interp.get_output_details()[0]['index']
+    run_model(np.zeros((1,224,224,3), dtype=np.float32))  # warm up
+    print("Model loaded.")
+
+def run_model(batch):
+    # Takes preprocessed float32 images; the model input is int8. Tensors are
+    # only re-planned when the batch size changes.
+    global input_shape
+    batch = np.clip(np.round(batch / input_scale + input_zero), -128, 127).astype(np.int8)
+    if batch.shape != input_shape:
+        interp.resize_tensor_input(input_index, batch.shape)
+        interp.allocate_tensors()
+        input_shape = batch.shape
+    interp.set_tensor(input_index, batch)
+    interp.invoke()
+    return interp.get_tensor(output_index)
+
+# ----- INFERENCE BATCHING -----
+# Requests enqueue a preprocessed image and wait; one worker runs the model on
+# up to BATCH images at a time. A lone request runs immediately; when others
+# are already queued, more are collected for up to BATCH_WINDOW seconds.
+BATCH = 16
+BATCH_WINDOW = 0.02
+infer_queue = queue.Queue()
+
+def infer_worker():
+    while True:
+        jobs = [infer_queue.get()]
+        if not infer_queue.empty():
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(jobs) < BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    jobs.append(infer_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        try:
+            out = run_model(np.stack([x for x, _, _ in jobs]).astype(np.float32, copy=False))
+            for (_, done, holder), feats in zip(jobs, out):
+                holder['feats'] = feats
+                done.set()
+        except Exception as e:
+            for _, done, holder in jobs:
+                holder['error'] = e
+                done.set()
+
+def start_inference():
+    # Neither the interpreter's thread pool nor the batching thread survives a
+    # fork, so under `gunicorn --preload` each worker calls this from post_fork
+    # (see gunicorn.conf.py) while the master only imports and converts.
+    global infer_thread
+    load_interpreter()
+    infer_thread = threading.Thread(target=infer_worker, daemon=True)
+    infer_thread.start()
+
+infer_thread = None
+INFER_TIMEOUT = 30
+
+if os.environ.get('PRELOAD_APP') != '1':
+    start_inference()
+
+def infer(x):
+    if interp is None or infer_thread is None or not infer_thread.is_alive():
+        raise RuntimeError("Inference is not running; with PRELOAD_APP=1 the "
+                           "gunicorn post_fork hook must call start_inference().")
+    done, holder = threading.Event(), {}
+    infer_queue.put((x, done, holder))
+    if not done.wait(INFER_TIMEOUT):
+        raise RuntimeError("Timed out waiting for feature extraction.")
+    if 'error' in holder:
+        raise holder['error']
+    return holder['feats']
+
+@functools.lru_cache(maxsize=512)
+def cached_features(image_hash):
+    # Raises KeyError on a miss so that misses are not cached.
+    row = db.session.query(Item.features).filter_by(image_hash=image_hash).limit(1).first()
+    if row is None or row.features is None:
+        raise KeyError(image_hash)
+    return unpack_features(row.features)
+
+# Disk cache of model outputs keyed by content hash and model fingerprint;
+# survives restarts and /reset.
+memory = Memory(os.path.join(BASE_DIR, '.featcache'), verbose=0)
+memory.reduce_size(bytes_limit=2 << 30)
+
+@memory.cache(ignore=['image_io'])
+def extract_by_hash(image_hash, model_fingerprint, image_io):
+    return infer(preprocess_image(image_io)).flatten()
+
+def extract_features(image_io, image_hash):
+    try:
+        return cached_features(image_hash)
+    except KeyError:
+        pass
+    return extract_by_hash(image_hash, MODEL_FINGERPRINT, image_io)
+
+UPLOAD_CHUNK = 1 << 20
 
 def save_image(file_storage):
+    # One pass over the upload: hash it, write it to disk and keep the bytes
+    # in memory so feature extraction does not read the file back.
     ext = os.path.splitext(file_storage.filename)[1]
     unique_name = str(uuid.uuid4()) + ext
     path = os.path.join(UPLOAD_FOLDER, unique_name)
-    file_storage.save(path)
-    return unique_name, path
+    h = hashlib.blake2b(digest_size=16)
+    image_io = io.BytesIO()
+    with open(path, 'wb', buffering=UPLOAD_CHUNK) as out:
+        for chunk in iter(lambda: file_storage.stream.read(UPLOAD_CHUNK), b''):
+            h.update(chunk)
+            out.write(chunk)
+            image_io.write(chunk)
+    image_io.seek(0)
+    return unique_name, path, h.hexdigest(), image_io
 
-def compute_similarity(a, b):
-    try:
-        return float(cosine_similarity([a], [b])[0][0])
-    except:
-        return 0.0
+# ----- LOST FEATURE CACHE -----
+# With hnswlib, lost-item features live only in an HNSW index for approximate
+# top-k. Without it, quantized rows go into a preallocated int8 buffer so exact
+# matching is a single int8 matmul over LOST_Q[:LOST_COUNT].
+MATCH_THRESHOLD = 0.75
+LOST_CAPACITY = 1024
+LOST_Q = None
+LOST_IDS = None
+LOST_COUNT = 0
+lost_last_id = 0
+lost_schema_version = None
+lost_lock = threading.Lock()
+
+# hnswlib optional — falls back to the exact scan
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+    print("hnswlib not installed; using exact feature matching.")
+
+ANN_K = 50
+ANN_CAPACITY = 100000
+
+def new_lost_index():
+    if hnswlib is None:
+        return None
+    # Vectors are stored normalized, so inner product equals cosine similarity
+    # and the index need not renormalize every insert and query.
+    index = hnswlib.Index(space='ip', dim=FEAT_DIM)
+    index.init_index(max_elements=ANN_CAPACITY, ef_construction=200, M=16)
+    index.set_ef(ANN_K)
+    return index
+
+def empty_lost_cache():
+    # Caller holds lost_lock (or is module import).
+    global LOST_Q, LOST_IDS, LOST_COUNT, lost_last_id, lost_index
+    lost_index = new_lost_index()
+    if lost_index is None:
+        LOST_Q = np.empty((LOST_CAPACITY, FEAT_DIM), dtype=np.int8)
+        LOST_IDS = np.empty(LOST_CAPACITY, dtype=np.int64)
+    LOST_COUNT = lost_last_id = 0
+
+empty_lost_cache()
+
+def append_lost_rows(ids, rows):
+    # Caller holds lost_lock. Capacity doubles, so inserts copy nothing on
+    # average; views of LOST_Q[:LOST_COUNT] held by readers stay valid.
+    global LOST_Q, LOST_IDS, LOST_COUNT
+    n = LOST_COUNT + len(ids)
+    if n > len(LOST_IDS):
+        capacity = max(n, 2 * len(LOST_IDS))
+        q = np.empty((capacity, FEAT_DIM), dtype=np.int8)
+        q[:LOST_COUNT] = LOST_Q[:LOST_COUNT]
+        id_buf = np.empty(capacity, dtype=np.int64)
+        id_buf[:LOST_COUNT] = LOST_IDS[:LOST_COUNT]
+        LOST_Q, LOST_IDS = q, id_buf
+    LOST_Q[LOST_COUNT:n] = rows
+    LOST_IDS[LOST_COUNT:n] = ids
+    LOST_COUNT = n
+
+def sync_lost_feats():
+    # Picks up lost items committed since the last sync (including by other workers).
+    global lost_last_id, lost_schema_version
+    with lost_lock:
+        # Rebuild if the tables were recreated since the last sync (stale ids).
+        version = schema_version()
+        if version != lost_schema_version:
+            empty_lost_cache()
+            lost_schema_version = version
+        ids, vecs = [], []
+        for item_id, blob in (db.session.query(Item.id, Item.features)
+                              .filter(Item.type == 'lost', Item.id > lost_last_id)
+                              .order_by(Item.id).yield_per(500)):
+            ids.append(item_id)
+            vecs.append(np.frombuffer(blob, dtype=np.int8))
+        if not ids:
+            return
+        new_q = np.array(vecs).reshape(-1, FEAT_DIM)
+        if lost_index is None:
+            append_lost_rows(ids, new_q)
+        else:
+            count = lost_index.get_current_count() + len(ids)
+            if count > lost_index.get_max_elements():
+                lost_index.resize_index(max(count, 2 * lost_index.get_max_elements()))
+            lost_index.add_items(new_q.astype(np.float32) / QSCALE, ids)
+        lost_last_id = ids[-1]
+
+def clear_lost_feats():
+    global lost_schema_version
+    with lost_lock:
+        empty_lost_cache()
+        lost_schema_version = None
+
+def find_matches(feats):
+    # Returns (lost item id, similarity) pairs at or above MATCH_THRESHOLD, best first.
+    v = normalize(feats)
+    with lost_lock:
+        exact = lost_index is None
+        if exact:
+            Q, ids = LOST_Q[:LOST_COUNT], LOST_IDS[:LOST_COUNT]
+        else:
+            k = min(ANN_K, lost_index.get_current_count())
+            if not k:
+                return []
+            labels, dists = lost_index.knn_query(v, k=k)
+            ids, sims = labels[0], 1 - dists[0]
+    if exact:
+        # Accumulate in int32 (int8/int16 would overflow) without upcasting Q.
+        sims = np.einsum('ij,j->i', Q, quantize(v), dtype=np.int32) / QSCALE**2
+    keep = np.where(sims >= MATCH_THRESHOLD)[0]
+    keep = keep[np.argsort(-sims[keep], kind='stable')]
+    return [(int(ids[i]), float(sims[i])) for i in keep]
+
+with app.app_context():
+    sync_lost_feats()
+
+# The user loader runs on every authenticated request; keep detached users
+# for a short while instead of a SELECT each time.
+user_cache = TTLCache(maxsize=10_000, ttl=60)
+user_cache_lock = threading.Lock()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    key = (schema_version(), int(user_id))
+    with user_cache_lock:
+        user = user_cache.get(key)
+    if user is None:
+        user = User.query.get(key[1])
+        if user is not None:
+            # Detached, so a commit in a later request cannot expire it.
+            db.session.expunge(user)
+            with user_cache_lock:
+                user_cache[key] = user
+    return user
+
+def forget_user(user_id):
+    with user_cache_lock:
+        for key in [k for k in user_cache if k[1] == user_id]:
+            user_cache.pop(key, None)
+
+# ----- PASSWORDS -----
+ph = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+def verify_password(user, password):
+    # Accounts created before argon2 still hold werkzeug pbkdf2 hashes; they
+    # are checked the old way and rehashed on a successful login.
+    if user.password.startswith('$argon2'):
+        try:
+            ph.verify(user.password, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if not ph.check_needs_rehash(user.password):
+            return True
+    elif not check_password_hash(user.password, password):
+        return False
+    user.password = ph.hash(password)
+    db.session.commit()
+    forget_user(user.id)
+    return True
+
+# ----- NOTIFICATIONS -----
+# /found records pending Notification rows; email/SMS go out on background
+# threads so the request only waits on inference.
+notify_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+def match_message(lost_name, found_item, sim):
+    return (f"A found item may match your lost item '{lost_name}' (similarity {sim:.2f}).\n"
+            f"Found item: {found_item.name}\n"
+            f"Location: {found_item.location}\n"
+            f"Contact: {found_item.contact}")
+
+def notify_user(conn, receiver, message):
+    # Returns whether any channel was used.
+    sent = False
+    if conn is not None:
+        conn.send(Message("Possible match for your lost item", recipients=[receiver.email], body=message))
+        sent = True
+    if USE_TWILIO and receiver.phone:
+        twilio_client.messages.create(body=message, from_=TWILIO_FROM, to=receiver.phone)
+        sent = True
+    return sent
+
+def send_notifications(found_id):
+    # Runs on notify_executor; the batch shares one SMTP connection and the
+    # statuses are written back with a single executemany.
+    with app.app_context():
+        try:
+            # Plain rows, and the session closed before any SMTP/SMS I/O, so no
+            # pooled connection is held while the network calls run.
+            pending = (Notification.query.with_entities(Notification.id, Notification.receiver_id, Notification.message)
+                       .filter_by(found_item_id=found_id, status='pending').all())
+            receivers = {u.id: u for u in User.query.with_entities(User.id, User.email, User.phone)
+                         .filter(User.id.in_({n.receiver_id for n in pending}))}
+            db.session.close()
+            results = []
+            stack = contextlib.ExitStack()
+            conn, mail_failed = None, False
+            if USE_MAIL:
+                try:
+                    conn = stack.enter_context(mail.connect())
+                except Exception as e:
+                    print(f"SMTP connection for found item {found_id} failed: {e}")
+                    mail_failed = True
+            for n in pending:
+                try:
+                    # SMS still goes out without SMTP; the email part makes it 'failed'.
+                    sent = notify_user(conn, receivers[n.receiver_id], n.message)
+                    status = 'failed' if mail_failed else 'sent' if sent else 'skipped'
+                except Exception as e:
+                    print(f"Notification {n.id} failed: {e}")
+                    status = 'failed'
+                results.append({'nid': n.id, 'new_status': status,
+                                'sent': datetime.datetime.utcnow() if status == 'sent' else None})
+            try:
+                stack.close()
+            except Exception as e:
+                print(f"Closing SMTP connection failed: {e}")
+            if results:
+                table = Notification.__table__
+                with db.engine.begin() as c:
+                    c.execute(table.update().where(table.c.id == bindparam('nid'))
+                              .values(status=bindparam('new_status'), sent_time=bindparam('sent')),
+                              results)
+        except Exception as e:
+            print(f"Notifications for found item {found_id} failed: {e}")
 
 # ----- ROUTES -----
 @app.route('/')
@@ -131,10 +612,11 @@ def register():
         if User.query.filter((User.username==username)|(User.email==email)).first():
             flash("Username or email already exists.", "error")
             return redirect(url_for('register'))
-        password_hash = generate_password_hash(password)
+        password_hash = ph.hash(password)
         user = User(username=username, email=email, password=password_hash, phone=phone)
         db.session.add(user)
         db.session.commit()
+        forget_user(user.id)
         flash("Registration successful. Please log in.", "success")
         return redirect(url_for('login'))
     return render_template('register.html')
@@ -145,7 +627,7 @@ def login():
         email = request.form['email'].strip().lower()
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password, password):
+        if user and verify_password(user, password):
             login_user(user)
             flash("Logged in successfully.", "success")
             return redirect(url_for('dashboard'))
@@ -155,6 +637,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    forget_user(current_user.id)
     logout_user()
     flash("Logged out.", "info")
     return redirect(url_for('index'))
@@ -162,8 +645,9 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    lost = Item.query.filter_by(user_id=current_user.id, type='lost').all()
-    found = Item.query.filter_by(user_id=current_user.id, type='found').all()
+    listing = load_only(Item.image_filename, Item.name, Item.location, Item.date)
+    lost = Item.query.options(listing).filter_by(user_id=current_user.id, type='lost').all()
+    found = Item.query.options(listing).filter_by(user_id=current_user.id, type='found').all()
     return render_template('dashboard.html', lost=lost, found=found)
 
 @app.route('/lost', methods=['GET','POST'])
@@ -174,15 +658,17 @@ def lost():
         if not f:
             flash("Please upload an image.", "error")
             return redirect(url_for('lost'))
-        filename, path = save_image(f)
-        feats = extract_features(path)
+        filename, path, image_hash, image_io = save_image(f)
+        feats = extract_features(image_io, image_hash)
         item = Item(user_id=current_user.id, type='lost', name=request.form.get('name',''),
                     description=request.form.get('description',''),
                     location=request.form.get('location',''),
                     contact=request.form.get('contact',''),
-                    image_filename=filename, features=json.dumps(feats))
+                    image_filename=filename, image_hash=image_hash,
+                    features=pack_features(feats))
         db.session.add(item)
         db.session.commit()
+        sync_lost_feats()
         flash("Lost item reported.", "success")
         return redirect(url_for('dashboard'))
     return render_template('lost.html')
@@ -195,27 +681,51 @@ def found():
         if not f:
             flash("Please upload an image.", "error")
             return redirect(url_for('found'))
-        filename, path = save_image(f)
-        feats = extract_features(path)
+        filename, path, image_hash, image_io = save_image(f)
+        feats = extract_features(image_io, image_hash)
+        sync_lost_feats()
+        hits = find_matches(feats)
+
         found_item = Item(user_id=current_user.id, type='found', name=request.form.get('name',''),
                           description=request.form.get('description',''),
                           location=request.form.get('location',''),
                           contact=request.form.get('contact',''),
-                          image_filename=filename, features=json.dumps(feats))
+                          image_filename=filename, image_hash=image_hash,
+                          features=pack_features(feats))
         db.session.add(found_item)
+        db.session.flush()
+        sims = dict(hits)
+        with db.session.no_autoflush:
+            owners = (db.session.query(Item.id, Item.user_id, Item.name)
+                      .filter(Item.type == 'lost', Item.id.in_(list(sims)),
+                              Item.user_id.isnot(None)).all())
+            notif_rows = [{'receiver_id': user_id, 'lost_item_id': lost_id,
+                           'found_item_id': found_item.id, 'status': 'pending',
+                           'message': match_message(name, found_item, sims[lost_id])}
+                          for lost_id, user_id, name in owners]
+            if notif_rows:
+                db.session.execute(Notification.__table__.insert(), notif_rows)
+        found_id = found_item.id
+        # One short write transaction; the notification job reads the committed rows.
         db.session.commit()
+        if notif_rows:
+            notify_executor.submit(send_notifications, found_id)
 
-        matches = []
-        lost_items = Item.query.filter_by(type='lost').all()
-        for li in lost_items:
-            sim = compute_similarity(np.array(feats), li.feature_array())
-            if sim >= 0.75:
-                matches.append({'item': li, 'similarity': round(sim,3)})
+        lost_items = {li.id: li for li in Item.query.options(defer(Item.features))
+                      .filter(Item.type == 'lost', Item.id.in_([item_id for item_id, _ in hits])).all()}
+        matches = [{'item': lost_items[item_id], 'similarity': round(sim,3)}
+                   for item_id, sim in hits if item_id in lost_items]
         return render_template('results.html', matches=matches, query_image=filename)
     return render_template('found.html')
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
+    if SENDFILE == 'nginx':
+        path = safe_join(UPLOAD_FOLDER, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        return Response(headers={'X-Accel-Redirect': X_ACCEL_PREFIX + quote(filename)}, mimetype=mimetype)
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 @app.route('/reset')
@@ -225,6 +735,10 @@ def reset():
         except: pass
     db.drop_all()
     db.create_all()
+    clear_lost_feats()
+    cached_features.cache_clear()
+    with user_cache_lock:
+        user_cache.clear()
     return "Reset complete"
 
 # ----- RUN -----
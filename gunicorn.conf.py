@@ -0,0 +1,26 @@
+# Loaded automatically by `gunicorn app:app` from this directory.
+# The master imports app.py once (TensorFlow, the converted model, the lost
+# feature cache) and workers share those pages copy-on-write.
+import os
+
+workers = 4
+# Threaded workers let concurrent uploads reach the inference batching queue
+# together; sync workers would only ever hand it one image at a time.
+# Notification threads check out a connection only for their reads and the
+# final status update, never across SMTP/SMS, so these 8 request threads
+# leave room in SQLAlchemy's default pool (5 + 10 overflow) per worker.
+worker_class = 'gthread'
+threads = 8
+preload_app = True
+timeout = 60
+raw_env = ['PRELOAD_APP=1',
+           f'INFER_THREADS={max(1, (os.cpu_count() or 1) // workers)}']
+
+def post_fork(server, worker):
+    import app as lostfound  # already imported by the master
+
+    # Pooled SQLite connections were opened before the fork; drop them
+    # without closing the master's handles.
+    with lostfound.app.app_context():
+        lostfound.db.engine.dispose(close=False)
+    lostfound.start_inference()